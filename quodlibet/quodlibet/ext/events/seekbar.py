@@ -18,24 +18,54 @@ from quodlibet.qltk.seekbutton import TimeLabel, SeekButton
 from quodlibet.util import connect_destroy
 from configparser import NoOptionError
 
+# bound once, these are used in handlers running at tick/event rate
+_timeout_add = GLib.timeout_add
+_source_remove = GLib.source_remove
+_sig_block = GObject.signal_handler_block
+_sig_unblock = GObject.signal_handler_unblock
+_get_monotonic_time = GLib.get_monotonic_time
 
-class SynchronizedTimeTracker(GObject.GObject):
-    """Emits exactly one tick every second as long as the player is actively
-       playing.
+# time (ms) without scroll/key events after which the new value is seeked to
+_SCROLL_COMMIT_DELAY = 200
 
-    Tries to synchronize with playback so that the tick is emitted exactly
+
+class _HandlerBlock(object):
+    """Blocks a fixed set of (object, handler_id) pairs together"""
+
+    def __init__(self, handlers):
+        self._handlers = tuple(handlers)
+
+    def block(self):
+        for obj, handler_id in self._handlers:
+            _sig_block(obj, handler_id)
+
+    def unblock(self):
+        for obj, handler_id in self._handlers:
+            _sig_unblock(obj, handler_id)
+
+
+class SynchronizedTimeTracker(object):
+    """Calls `on_tick` with the playback position (ms) exactly once every
+       second as long as the player is actively playing.
+
+    Tries to synchronize with playback so that the tick happens exactly
     at full seconds of playback position. The maximum allowed disparity between
     tick and playback position is 30 ms (self.offset + self.max_delta) behind
     actual playback position.
-    """
 
-    __gsignals__ = {
-        'tick': (GObject.SignalFlags.RUN_LAST, None, ()),
-    }
+    Once in phase with playback the same timeout source is kept. This uses
+    timeout_add and not timeout_add_seconds on purpose: the latter rounds
+    its expiry to a per-process second boundary and can't keep the phase,
+    which would lead to late or skipped ticks.
 
-    def __init__(self, player):
-        GObject.GObject.__init__(self)
+    Starts out paused, call resume() to start ticking. Seeks and song
+    changes have to be passed in through notify_seek() and
+    notify_song_started().
+    """
+
+    def __init__(self, player, on_tick=None):
         self._player = player
+        self._on_tick = on_tick
 
         # offset (ms) is additional time added to full seconds just to be sure
         # we are waking up right after full seconds of player's position
@@ -45,55 +75,81 @@ class SynchronizedTimeTracker(GObject.GObject):
         # synchronize itself with playback
         self.max_delta = 20
 
+        # interval (ms) to the next full second when at position 0
+        self._interval_base = 1000 + self.offset
+
         self.__source_id = None
         self.__tick_prev_sec = 0
+        self.__suspended = True
 
         self.__sigs = [
             player.connect("paused", self.__disable),
             player.connect("unpaused", self.__enable),
-            player.connect("seek", self.__seek),
-            player.connect("song-started", self.__song_started),
         ]
 
-        if not player.paused:
-            self.__enable()
+    def notify_song_started(self):
+        """Has to be called by the owner when a new song starts"""
 
-    def __song_started(self, player, song):
         if self.__tick_prev_sec == 1:
             self.__tick_prev_sec = 0
 
-    def __seek(self, player, song, seek):
-        self.__tick_prev_sec = seek // 1000
-        if not player.paused:
+    def notify_seek(self, ms):
+        """Has to be called by the owner after the player seeked"""
+
+        self.__tick_prev_sec = ms // 1000
+        if not self._player.paused:
             self.restart()
 
-    def __run(self, last_interval):
-        position = self._player.get_position()
-        current_sec = position // 1000
+    def __tick(self, position, current_sec):
         if current_sec != self.__tick_prev_sec and current_sec != 0:
-            self.emit("tick")
+            if self._on_tick is not None:
+                self._on_tick(position)
             self.__tick_prev_sec = current_sec
-        interval = 1000 + self.offset - (position % 1000)
+
+    def __run(self, last_interval):
+        position = self._player.get_position()
+        current_sec, sub_ms = divmod(position, 1000)
+        self.__tick(position, current_sec)
+        interval = self._interval_base - sub_ms
         if abs(last_interval - interval) > self.max_delta:
-            self.__source_id = GLib.timeout_add(interval, self.__run, interval)
+            self.__source_id = _timeout_add(interval, self.__run, interval)
         else:
             return True
 
     def __enable(self, *args):
-        if self.__source_id is None:
+        if self.__source_id is None and not self.__suspended:
             position = self._player.get_position()
-            interval = 1000 + self.offset - (position % 1000)
-            self.__source_id = GLib.timeout_add(interval, self.__run, interval)
+            interval = self._interval_base - (position % 1000)
+            self.__source_id = _timeout_add(interval, self.__run, interval)
 
     def __disable(self, *args):
         if self.__source_id is not None:
-            GLib.source_remove(self.__source_id)
+            _source_remove(self.__source_id)
             self.__source_id = None
 
     def restart(self, *args):
         self.__disable()
         self.__enable()
 
+    @property
+    def running(self):
+        """If a timeout for the next tick is installed"""
+
+        return self.__source_id is not None
+
+    def pause(self):
+        """Stop ticking until resume() is called, even if playing"""
+
+        self.__suspended = True
+        self.__disable()
+
+    def resume(self):
+        """Undo pause(), starts ticking again if the player is playing"""
+
+        self.__suspended = False
+        if not self._player.paused:
+            self.__enable()
+
     def destroy(self):
         self.__disable()
         for signal_id in self.__sigs:
@@ -121,6 +177,23 @@ class SeekBar(Gtk.Box):
         self.__timer_mode = 'both'
         self.__pressed_lmb = False
         self.__source_id = None
+        self.__scroll_start_value = None
+        self.__last_scroll_time = 0
+
+        # last known real playback position and the monotonic time (ms)
+        # it was taken at, used to avoid querying the player on every tick
+        self._pos_anchor_ms = 0
+        self._pos_anchor_mono = 0
+
+        # length of the current song in seconds
+        self._cached_length = 0
+
+        # last values pushed to the widgets, to skip redundant updates
+        self._last_elapsed_sec = -1
+        self._last_pval_ms = -1
+
+        # pending one-shot frame clock callback, see _on_tick()
+        self.__frame_id = None
 
         self.elapsed_button = Gtk.Button()
 
@@ -151,19 +224,34 @@ class SeekBar(Gtk.Box):
                            self._on_button_release, player)
         self.__id_button_press_event = self.scale.connect(
             'button-press-event', self._on_button_press, player)
-        self.__id_change_value = self.scale.connect(
-            'change-value', self._on_scale_value_change_request, player)
-
-        self.__id_value_changed = self.scale.connect(
+        self.__id_scroll_event = self.scale.connect(
+            'scroll-event', self._on_scale_scroll, player)
+        self.__id_move_slider = self.scale.connect(
+            'move-slider', self._on_scale_scroll, player)
+
+        # set while we change the scale value ourselves, so value-changed
+        # only updates the labels for changes made by the user
+        self._in_programmatic_update = False
+        self.scale.connect(
             'value-changed', self._on_scale_value_changed, player)
-        GObject.signal_handler_block(self.scale, self.__id_value_changed)
 
-        self._tracker = SynchronizedTimeTracker(player)
-        self._tracker.connect('tick', self._on_tick, player)
+        # handlers blocked from button press until button release
+        self._press_block_set = _HandlerBlock([
+            (self.scale, self.__id_button_press_event),
+            (self.scale, self.__id_scroll_event),
+            (self.scale, self.__id_move_slider),
+        ])
+
+        self._tracker = SynchronizedTimeTracker(
+            player, on_tick=lambda ms: self._on_tick(player, ms))
 
         connect_destroy(player, 'seek', self._on_seek)
         connect_destroy(player, 'song-started', self._on_song_start)
+        connect_destroy(player, 'paused', self._on_paused)
+        connect_destroy(player, 'unpaused', self._on_paused)
         connect_destroy(player, "notify::seekable", self._update)
+        connect_destroy(
+            library, 'changed', self._on_library_changed, player)
 
         self.connect("destroy", self._on_destroy)
 
@@ -171,17 +259,10 @@ class SeekBar(Gtk.Box):
 
     def _set_timer_mode(self, mode='both'):
 
-        widgets = find_widgets(self, TimeLabel)
-        for elem in widgets:
-            name = elem.get_name()
-            if name == 'elapsed-label' or name == 'remaining-label':
-                self.remove(elem)
-
-        widgets = find_widgets(self.box, TimeLabel)
-        for elem in widgets:
-            name = elem.get_name()
-            if name == 'elapsed-label' or name == 'remaining-label':
-                self.box.remove(elem)
+        for label in (self.elapsed_label, self.remaining_label):
+            parent = label.get_parent()
+            if parent is not None:
+                parent.remove(label)
 
         if mode == 'both':
             self.box.pack_start(self.elapsed_label, True, True, 0)
@@ -195,83 +276,195 @@ class SeekBar(Gtk.Box):
         config.set('plugins', self.c_timer_mode, self.__timer_mode)
 
     def _on_destroy(self, *args):
+        self._pause_updates()
         self._tracker.destroy()
+        if self.__source_id is not None:
+            _source_remove(self.__source_id)
+            self.__source_id = None
 
     def _on_timer_clicked(self, button):
 
         i = self._timer_modes.index(self.__timer_mode)
         self._set_timer_mode(self._timer_modes[i-1])
 
+    def _set_position_anchor(self, ms):
+        self._pos_anchor_ms = ms
+        self._pos_anchor_mono = _get_monotonic_time() // 1000
+
+    def _inferred_position_ms(self, player):
+        """Returns the playback position in ms, interpolated from the last
+        known real position instead of querying the player
+        """
+
+        position = self._pos_anchor_ms
+        if not player.paused:
+            now = _get_monotonic_time() // 1000
+            position += now - self._pos_anchor_mono
+        if self._cached_length:
+            position = min(position, self._cached_length * 1000)
+        return position
+
+    def _on_paused(self, player, *args):
+        self._set_position_anchor(player.get_position())
+
+    def start_updates(self):
+        """Start updating the time display while playing. Should be called
+        once the bar is in place.
+        """
+
+        self._resume_updates()
+
+    def _resume_updates(self):
+        """Start updating the labels and the scale while playing"""
+
+        self._tracker.resume()
+
+    def _pause_updates(self):
+        """Stop updating the labels and the scale until resumed"""
+
+        self._tracker.pause()
+        if self.__frame_id is not None:
+            self.scale.remove_tick_callback(self.__frame_id)
+            self.__frame_id = None
+
+    def _on_frame(self, scale, frame_clock, player):
+        self.__frame_id = None
+        if not self.__pressed_lmb:
+            position = self._inferred_position_ms(player)
+            self._update_labels(player, position)
+            self._update_scale(player, position)
+        return GLib.SOURCE_REMOVE
+
     def _on_seek(self, player, song, ms):
+        self._set_position_anchor(ms)
         self._update_labels(player, ms)
         self._update_scale(player, ms)
+        self._tracker.notify_seek(ms)
 
     def _on_button_press(self, scale, event, player):
-        GObject.signal_handler_block(self.scale, self.__id_button_press_event)
+        self._press_block_set.block()
         self.__pressed_lmb = True
-        GObject.signal_handler_unblock(self.scale, self.__id_value_changed)
-        GObject.signal_handler_block(self.scale, self.__id_change_value)
+        self._pause_updates()
         self.__pressed_lmb_scale_value = scale.get_value()
 
     def _on_button_release(self, scale, event, player):
-        GObject.signal_handler_block(self.scale, self.__id_value_changed)
         value = scale.get_value()
+        self.__pressed_lmb = False
         if player.seekable and self.__pressed_lmb_scale_value != value:
             player.seek(value * 1000)
-        GObject.signal_handler_unblock(self.scale, self.__id_change_value)
-        self.__pressed_lmb = False
-        GObject.signal_handler_unblock(
-            self.scale, self.__id_button_press_event)
+        self._press_block_set.unblock()
+        self._resume_updates()
+
+    def _set_scale_value(self, value):
+        """Set the scale value without handling it like a user change"""
+
+        self._in_programmatic_update = True
+        try:
+            self.scale.set_value(value)
+        finally:
+            self._in_programmatic_update = False
 
     def _on_scale_value_changed(self, scale, player):
+        if self._in_programmatic_update:
+            return
+        self._last_elapsed_sec = -1
         elapsed = scale.get_value()
-        remaining = elapsed - player.info("~#length")
+        remaining = elapsed - self._cached_length
         self.elapsed_label.set_time(elapsed)
         self.remaining_label.set_time(remaining)
 
-    def _on_scale_value_change_request(self, scale, scroll, value, player):
-        self.__pressed_lmb = True
-        if self.__source_id is not None:
-            GLib.source_remove(self.__source_id)
-        self.__source_id = GLib.timeout_add(
-            200, self.__scroll_timeout, value, player)
+    def _on_scale_scroll(self, scale, arg, player):
+        # The scale applies scroll and key movements itself, we only commit
+        # the resulting value once no new ones came in for a while.
+        # Instead of re-adding the timeout for every event, only the time
+        # is recorded and the timeout checks it.
+        self.__last_scroll_time = _get_monotonic_time() // 1000
+        if self.__source_id is None:
+            self.__pressed_lmb = True
+            self._pause_updates()
+            self.__scroll_start_value = scale.get_value()
+            self.__add_scroll_timeout(_SCROLL_COMMIT_DELAY, player)
+        return False
+
+    def __add_scroll_timeout(self, delay, player):
+        # idle priority, so committing the seek doesn't delay redraws
+        self.__source_id = _timeout_add(
+            delay, self.__scroll_timeout, player,
+            priority=GLib.PRIORITY_DEFAULT_IDLE)
+
+    def __scroll_timeout(self, player):
+        idle = _get_monotonic_time() // 1000 - self.__last_scroll_time
+        if idle < _SCROLL_COMMIT_DELAY:
+            self.__add_scroll_timeout(_SCROLL_COMMIT_DELAY - idle, player)
+            return GLib.SOURCE_REMOVE
 
-    def __scroll_timeout(self, value, player):
-        if player.seekable:
-            player.seek(value * 1000)
         self.__pressed_lmb = False
+        value = self.scale.get_value()
+        if player.seekable and self.__scroll_start_value != value:
+            player.seek(value * 1000)
         self.__source_id = None
-
-    def _on_tick(self, tracker, player):
-        if not self.__pressed_lmb:
-            self._update_labels(player)
-            self._update_scale(player)
+        self._resume_updates()
+        return GLib.SOURCE_REMOVE
+
+    def _on_tick(self, player, ms):
+        # the tracker queried the real position anyway, so re-anchor on it
+        self._set_position_anchor(ms)
+        if self.__pressed_lmb:
+            return
+        if self.scale.get_mapped():
+            # The tracker stays the 1 Hz driver, the frame clock is only
+            # used once per tick to show the update with the next frame.
+            if self.__frame_id is None:
+                self.__frame_id = self.scale.add_tick_callback(
+                    self._on_frame, player)
+        else:
+            self._update_labels(player, ms)
+            self._update_scale(player, ms)
 
     def _update_labels(self, player, ms=None):
         if ms is not None:
-            elapsed = ms // 1000
+            pval_ms = int(ms)
         else:
-            elapsed = player.get_position() // 1000
-        remaining = elapsed - player.info("~#length")
+            pval_ms = int(self._inferred_position_ms(player))
+        elapsed = pval_ms // 1000
+        if elapsed == self._last_elapsed_sec:
+            return
+        self._last_elapsed_sec = elapsed
+        remaining = elapsed - self._cached_length
         self.elapsed_label.set_time(elapsed)
         self.remaining_label.set_time(remaining)
 
     def _update_scale(self, player, ms=None):
+        if self.__pressed_lmb:
+            return
         if ms is not None:
-            pval = ms / 1000
+            pval_ms = int(ms)
         else:
-            pval = player.get_position() / 1000
-        sval = self.scale.get_value()
-        if (abs(pval - sval) > 0.001):
-            self.scale.set_value(pval)
+            pval_ms = int(self._inferred_position_ms(player))
+        if pval_ms == self._last_pval_ms:
+            return
+        self._last_pval_ms = pval_ms
+        self._set_scale_value(pval_ms / 1000)
 
     def _on_song_start(self, player, *args):
+        self._set_position_anchor(0)
         self._update(player, song_start=True)
+        self._tracker.notify_song_started()
+
+    def _on_library_changed(self, library, songs, player):
+        # the backend can update the length of the playing song
+        if player.song is not None and player.song in songs:
+            self._update(player)
 
     def _update(self, player, *args, song_start=False):
+        self._last_elapsed_sec = -1
+        self._last_pval_ms = -1
+
         if player.info:
-            self.scale.set_range(0, player.info("~#length"))
+            self._cached_length = player.info("~#length")
+            self.scale.set_range(0, self._cached_length)
         else:
+            self._cached_length = 0
             self.scale.set_range(0, 1)
 
         if player.seekable:
@@ -282,10 +475,11 @@ class SeekBar(Gtk.Box):
                 self._update_labels(player, 0)
                 self._update_scale(player, 0)
             else:
+                self._set_position_anchor(player.get_position())
                 self._update_labels(player)
                 self._update_scale(player)
         else:
-            self.scale.set_value(0)
+            self._set_scale_value(0)
             self.elapsed_label.set_disabled(True)
             self.remaining_label.set_disabled(True)
             self.set_sensitive(False)
@@ -306,6 +500,7 @@ class SeekBarPlugin(EventPlugin):
         self.buttons_table.attach(self.bar.elapsed_button, 1, 3, 0, 1)
         self.bar.show()
         app.window.set_seekbar_widget(self.bar)
+        self.bar.start_updates()
 
     def disabled(self):
         self.buttons_table.remove(self.bar.elapsed_button)
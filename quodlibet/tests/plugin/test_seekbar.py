@@ -5,10 +5,29 @@
 # the Free Software Foundation; either version 2 of the License, or
 # (at your option) any later version.
 
+import time
+
+from gi.repository import Gtk
+
 from tests.plugin import PluginTestCase
 
 from quodlibet.player.nullbe import NullPlayer
 from quodlibet.library import SongLibrary
+from quodlibet.formats import AudioFile
+from quodlibet.util import format_time_display
+
+
+def run_loop(msecs):
+    end = time.time() + msecs / 1000
+    while time.time() < end:
+        Gtk.main_iteration_do(False)
+        time.sleep(0.001)
+
+
+def seekable_player(length=10):
+    player = NullPlayer()
+    player.song = player.info = AudioFile({"~#length": length})
+    return player
 
 
 class TSeekBar(PluginTestCase):
@@ -19,6 +38,133 @@ class TSeekBar(PluginTestCase):
     def tearDown(self):
         del self.mod
 
+    def assertLabels(self, bar, elapsed, remaining):
+        self.assertEqual(
+            bar.elapsed_label.get_text(), format_time_display(elapsed))
+        self.assertEqual(
+            bar.remaining_label.get_text(), format_time_display(remaining))
+
     def test_create(self):
         SeekBar = self.mod.SeekBar
         SeekBar(NullPlayer(), SongLibrary()).destroy()
+
+    def test_seek(self):
+        player = seekable_player()
+        bar = self.mod.SeekBar(player, SongLibrary())
+        player.seek(1500)
+        self.assertEqual(bar.scale.get_value(), 1.5)
+        self.assertLabels(bar, 1, -9)
+        bar.destroy()
+
+    def test_tick(self):
+        player = seekable_player()
+        bar = self.mod.SeekBar(player, SongLibrary())
+        player.seek(1500)
+        bar._on_tick(player, 4200)
+        self.assertEqual(bar.scale.get_value(), 4.2)
+        self.assertLabels(bar, 4, -6)
+        bar.destroy()
+
+    def test_frame_update(self):
+        player = seekable_player()
+        bar = self.mod.SeekBar(player, SongLibrary())
+        player.seek(2500)
+        bar.scale.set_value(0)
+        # one-shot, the tracker schedules it once per tick
+        self.assertFalse(bar._on_frame(bar.scale, None, player))
+        self.assertLabels(bar, 2, -8)
+        bar.destroy()
+
+    def test_timer_mode(self):
+        bar = self.mod.SeekBar(NullPlayer(), SongLibrary())
+        bar._set_timer_mode("elapsed")
+        self.assertIs(bar.elapsed_label.get_parent(), bar.box)
+        self.assertIsNone(bar.remaining_label.get_parent())
+        bar._set_timer_mode("both")
+        self.assertIs(bar.remaining_label.get_parent(), bar)
+        bar.destroy()
+
+    def test_length_changed(self):
+        player = seekable_player()
+        library = SongLibrary()
+        bar = self.mod.SeekBar(player, library)
+        self.assertLabels(bar, 0, -10)
+        player.song["~#length"] = 20
+        library.emit("changed", [player.song])
+        self.assertLabels(bar, 0, -20)
+        bar.destroy()
+
+    def test_user_value_change(self):
+        player = seekable_player()
+        bar = self.mod.SeekBar(player, SongLibrary())
+
+        # changes by the user, including scroll and key movements, update
+        # the labels right away
+        bar.scale.set_value(5)
+        self.assertLabels(bar, 5, -5)
+
+        # our own changes of the scale don't touch them
+        bar._update_scale(player, 7000)
+        self.assertEqual(bar.scale.get_value(), 7)
+        self.assertLabels(bar, 5, -5)
+        bar.destroy()
+
+    def test_scroll_debounce(self):
+        player = seekable_player()
+        bar = self.mod.SeekBar(player, SongLibrary())
+
+        bar._on_scale_scroll(bar.scale, None, player)
+        bar.scale.set_value(3)
+        run_loop(100)
+        self.assertEqual(player.get_position(), 0)
+
+        # a new event pushes the commit back
+        bar._on_scale_scroll(bar.scale, None, player)
+        bar.scale.set_value(4)
+        run_loop(100)
+        self.assertEqual(player.get_position(), 0)
+
+        run_loop(300)
+        self.assertEqual(player.get_position(), 4000)
+        bar.destroy()
+
+    def test_tracker_tick(self):
+        player = NullPlayer()
+        player.paused = False
+        ticks = []
+        tracker = self.mod.SynchronizedTimeTracker(
+            player, on_tick=ticks.append)
+        player._position = 990
+        tracker.resume()
+        player._position = 1010
+        run_loop(100)
+        self.assertEqual(ticks, [1010])
+        self.assertTrue(tracker.running)
+        tracker.destroy()
+        self.assertFalse(tracker.running)
+
+    def test_tracker_pause_resume(self):
+        player = NullPlayer()
+        player.paused = False
+        tracker = self.mod.SynchronizedTimeTracker(player)
+
+        # starts out paused
+        self.assertFalse(tracker.running)
+        tracker.notify_seek(1000)
+        self.assertFalse(tracker.running)
+
+        tracker.resume()
+        self.assertTrue(tracker.running)
+
+        tracker.pause()
+        self.assertFalse(tracker.running)
+        tracker.notify_seek(2000)
+        self.assertFalse(tracker.running)
+        player.paused = True
+        player.paused = False
+        self.assertFalse(tracker.running)
+
+        tracker.resume()
+        self.assertTrue(tracker.running)
+        tracker.destroy()
+        self.assertFalse(tracker.running)